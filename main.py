@@ -1,11 +1,15 @@
 # === Importações base
-import os, json, time, datetime, logging, warnings
+import os, json, time, datetime, logging, warnings, functools, operator, threading, atexit
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import numpy as np
 import pandas as pd
 import ccxt
 from pathlib import Path
 import csv
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import OrderedDict
 
 # === TA (indicadores técnicos)
 # Precisamos do módulo inteiro para usar ta.momentum/ta.volatility nas funções gpt_
@@ -15,17 +19,24 @@ except Exception:
     ta = None
 
 # Você já usa algumas classes diretamente — ok manter:
-from ta.trend import EMAIndicator, MACD, ADXIndicator, SMAIndicator
-from ta.momentum import RSIIndicator, StochRSIIndicator
-from ta.volatility import AverageTrueRange, BollingerBands
-from ta.volume import OnBalanceVolumeIndicator
+from ta.trend import SMAIndicator
+from ta.momentum import StochRSIIndicator
+from ta.volatility import BollingerBands
 
-# === pandas-ta (opcional; fallback para cálculo manual)
+# === orjson (opcional; fallback para o json da stdlib)
 try:
-    import pandas_ta as pta
+    import orjson
 except Exception:
-    print("⚠️ pandas_ta não disponível, usando cálculo manual")
-    pta = None
+    orjson = None
+
+# === numba (opcional; sem numba os kernels rodam como Python puro)
+try:
+    from numba import njit
+except Exception:
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
 
 # === Ajustes de compatibilidade e limpeza de avisos
 pd.options.mode.chained_assignment = None
@@ -50,8 +61,32 @@ if not TOKEN or not CHAT_ID:
     TOKEN = "dummy_token"
     CHAT_ID = "dummy_chat"
 
+URL_TELEGRAM = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
+CABECALHO_JSON = {"Content-Type": "application/json"}
+
+# Sessão HTTP compartilhada (keep-alive: reaproveita conexão TLS entre chamadas)
+SESSAO_HTTP = requests.Session()
+SESSAO_HTTP.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    # Erro transitório do servidor (5xx) também reenvia; POST fica de fora (allowed_methods padrão).
+    # 429 não: repetir em segundos só gasta a cota, e o cache de fundamentos (que não guarda
+    # falhas) tenta de novo no próximo alerta. Retry-After ignorado: a espera não tem teto e o
+    # GET roda dentro da thread do par
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504),
+                      respect_retry_after_header=False)
+))
+
+def obter_json(url, timeout):
+    """GET na sessão compartilhada com o corpo já decodificado (orjson quando disponível)"""
+    resposta = SESSAO_HTTP.get(url, timeout=timeout)
+    if orjson is not None:
+        return orjson.loads(resposta.content)
+    return resposta.json()
+
 # Arquivos de dados
 ARQUIVO_SINAIS_MONITORADOS = 'sinais_monitorados.json'
+ARQUIVO_SINAIS_NOVOS = 'sinais_monitorados.jsonl'  # sinais novos desde o último snapshot (append-only)
 ARQUIVO_ESTATISTICAS = 'estatisticas_scanner.json'
 ARQUIVO_LEDGER = 'data/ledger_sinais.csv'
 ARQUIVO_THROTTLE = 'data/throttle.json'
@@ -63,8 +98,10 @@ ARQUIVO_THROTTLE = 'data/throttle.json'
 #   datefmt='%Y-%m-%d %H:%M:%S'
 #)
 
-# Controle de alertas
-alertas_enviados = {}
+# Controle de alertas (pares rodam em threads: throttle, ledger e sinais passam pelo lock)
+# alertas_enviados: (par, setup) -> instante monotônico do envio, em ordem de envio (mais antigo primeiro)
+alertas_enviados = OrderedDict()
+lock_alertas = threading.RLock()
 # ===============================
 # === ITEM 1.1: LOGS ESTRUTURADOS PT-BR
 # ===============================
@@ -260,8 +297,7 @@ def verificar_throttle(par, tempo_reenvio_min=30):
     throttle_file.parent.mkdir(exist_ok=True)
     
     if throttle_file.exists():
-        with open(throttle_file, 'r') as f:
-            throttle_data = json.load(f)
+        throttle_data = ler_json(throttle_file)
     else:
         throttle_data = {}
     
@@ -284,8 +320,7 @@ def verificar_throttle(par, tempo_reenvio_min=30):
     
     throttle_data[par] = agora.isoformat()
     
-    with open(throttle_file, 'w') as f:
-        json.dump(throttle_data, f, indent=2)
+    gravar_json(str(throttle_file), throttle_data)
     
     logger.info(f"✅ Throttle OK [{par}]: Pode enviar")
     return True
@@ -305,58 +340,116 @@ def validar_dados(df, nome_par):
     for col in colunas_essenciais:
         if col not in df.columns:
             return False
-        if df[col].isna().sum() > len(df) * 0.1:
+        valores = df[col].to_numpy(dtype=np.float64)
+        nulos = np.isnan(valores)
+        if nulos.sum() > len(df) * 0.1:
             return False
-        if (df[col] <= 0).sum() > 0:
+        if (valores[~nulos] <= 0).any():
             return False
     
     return True
 
-def limpar_dados(df):
-    """Limpeza de dados com proteção contra erros de versão"""
-    try:
-        # Criar uma cópia para evitar problemas de referência
-        df_clean = df.copy()
-        
-        # Filtros de validação
-        mask_valid = (
-            (df_clean['high'] >= df_clean['low']) & 
-            (df_clean['volume'] > 0)
-        )
-        
-        df_clean = df_clean[mask_valid].copy()
-        return df_clean.reset_index(drop=True)
-        
-    except Exception as e:
-        logging.warning(f"Erro na limpeza de dados: {e}")
-        # Fallback simples
-        return df.reset_index(drop=True)
+# ===============================
+# === COLUNAS PRÉ-EXTRAÍDAS (SoA)
+# ===============================
+
+# Colunas lidas pelos setups; extraídas uma única vez por timeframe
+COLUNAS_SETUPS = (
+    'open', 'high', 'low', 'close', 'volume',
+    'ema9', 'ema21', 'ema50', 'ema200',
+    'rsi', 'macd', 'macd_signal', 'adx', 'atr', 'obv',
+    'bb_upper', 'bb_middle', 'bb_lower', 'supertrend', 'stoch_rsi'
+)
+
+COLUNAS_OHLCV = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+def ohlcv_para_array(ohlcv):
+    """Lista de candles do ccxt -> array float64 (n, 6); None vira NaN"""
+    return np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(COLUNAS_OHLCV))
+
+def limpar_ohlcv(arr):
+    """
+    Limpeza direto no array, numa única máscara: descarta candles com
+    high < low, volume <= 0 ou algum OHLCV NaN/infinito.
+    """
+    h, l, v = arr[:, 2], arr[:, 3], arr[:, 5]
+    valido = (h >= l) & (v > 0) & np.isfinite(arr[:, 1:6]).all(axis=1)
+    return arr[valido]
+
+def ohlcv_para_df(ohlcv, limpar=False):
+    """
+    DataFrame OHLCV num único bloco float64, sem inferência por elemento.
+    O timestamp fica de fora: a análise não o usa.
+    """
+    arr = ohlcv_para_array(ohlcv)
+    if limpar:
+        arr = limpar_ohlcv(arr)
+    # Uma linha por coluna: cada coluna do DataFrame fica contígua para os kernels numba
+    colunas = np.ascontiguousarray(arr[:, 1:].T)
+    return pd.DataFrame(colunas.T, columns=list(COLUNAS_OHLCV[1:]), copy=False)
+
+def extrair_colunas(df):
+    """
+    Extrai as colunas usadas pelos setups para arrays NumPy (uma leitura por coluna).
+    Retorna (last, cols): dict com o último valor de cada coluna (mais as médias
+    volume_media/atr_media/obv_media, padrões de candle e resistencia_10) e dict de arrays.
+    Colunas ausentes viram arrays de NaN.
+    """
+    n = len(df)
+    cols = {}
+    for col in COLUNAS_SETUPS:
+        if col in df.columns:
+            cols[col] = df[col].to_numpy()
+        else:
+            cols[col] = np.full(n, np.nan)
+    # Escalares nativos (float/bool): comparações nos setups sem o custo dos escalares NumPy
+    last = {col: arr[-1].item() for col, arr in cols.items()}
+
+    # Médias da janela inteira lidas por vários setups: calculadas uma vez aqui
+    last['volume_media'] = float(cols['volume'].mean())
+    last['volume_media_20'] = float(cols['volume'][-20:].mean())
+    last['atr_media'] = float(np.nanmean(cols['atr']))
+    last['obv_media'] = float(np.nanmean(cols['obv']))
+
+    # Padrões de candle consultados pelos setups
+    last['candle_forte'], last['engolfo_alta'], last['martelo'] = detectar_padroes_candle(cols)
+
+    # Máxima dos candles anteriores ao atual na janela de 10 (resistência do rompimento)
+    last['resistencia_10'] = float(cols['high'][-10:-1].max()) if n >= 10 else np.nan
+    return last, cols
+
+def ultima_linha(df, colunas):
+    """Último valor de cada coluna como dict (sem materializar a Series de df.iloc[-1])"""
+    return {col: df[col].to_numpy()[-1] for col in colunas}
 
 # ===============================
 # === SISTEMA DE MÚLTIPLOS TIMEFRAMES
 # ===============================
 
+def _buscar_ohlcv_tf(exchange, par, tf):
+    """OHLCV do timeframe (janela de limite_candles candles)"""
+    return exchange.fetch_ohlcv(par, tf, limit=limite_candles)
+
 def analisar_multiplos_timeframes(exchange, par):
     """Analisa o mesmo par em múltiplos timeframes e retorna DF + métricas por TF."""
     resultados = {}
+
+    # Downloads dos timeframes em paralelo (latência ~ a maior, não a soma)
+    with ThreadPoolExecutor(max_workers=len(TIMEFRAMES)) as pool:
+        downloads = {tf: pool.submit(_buscar_ohlcv_tf, exchange, par, tf) for tf in TIMEFRAMES}
+
     for tf in TIMEFRAMES:
         try:
             print(f"    📈 Timeframe {tf}...")
-            ohlcv = exchange.fetch_ohlcv(par, tf, limit=limite_candles)
+            ohlcv = downloads[tf].result()
 
             # Verificação inicial
             if not ohlcv or len(ohlcv) < 100:
                 resultados[tf] = {"status": "dados_insuficientes", "candles": (len(ohlcv) if ohlcv else 0)}
                 continue
 
-            # DataFrame base + limpeza
-            df = pd.DataFrame(ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"])
-            df = limpar_dados(df)
-
-            # Sanitização extra
-            cols = ["open", "high", "low", "close", "volume"]
-            df[cols] = df[cols].apply(pd.to_numeric, errors="coerce")
-            df = df.replace([np.inf, -np.inf], np.nan).dropna(subset=cols).reset_index(drop=True)
+            # Limpeza e sanitização no array; o DataFrame é montado uma vez, já limpo
+            df = ohlcv_para_df(ohlcv, limpar=True)
 
             # Amostra mínima
             if len(df) < 100:
@@ -374,22 +467,27 @@ def analisar_multiplos_timeframes(exchange, par):
                 resultados[tf] = {"status": "dados_invalidos"}
                 continue
 
+            # Arrays por coluna (lidos uma vez e compartilhados por todos os setups)
+            last, cols = extrair_colunas(df)
+
             # ----- Métricas necessárias para os setups/alerta -----
-            preco = float(df["close"].iloc[-1])
-            tendencia = determinar_tendencia(df)
-            forca = calcular_forca_tendencia(df)
-            volatilidade = calcular_volatilidade(df)
+            preco = float(last["close"])
+            tendencia = determinar_tendencia(last)
+            forca = calcular_forca_tendencia(last, cols)
+            volatilidade = calcular_volatilidade(last)
 
             # Alguns campos usados por mensagens/setups:
-            rsi_val = float(df["rsi"].iloc[-1]) if "rsi" in df.columns else float("nan")
-            macd_val = float(df["macd"].iloc[-1]) if "macd" in df.columns else float("nan")
-            macd_sig = float(df["macd_signal"].iloc[-1]) if "macd_signal" in df.columns else float("nan")
-            vol_ma = df["volume"].rolling(20, min_periods=1).mean().iloc[-1]
-            volume_ratio = float(df["volume"].iloc[-1] / vol_ma) if vol_ma else 0.0
+            rsi_val = float(last["rsi"])
+            macd_val = float(last["macd"])
+            macd_sig = float(last["macd_signal"])
+            vol_ma = last["volume_media_20"]
+            volume_ratio = float(last["volume"] / vol_ma) if vol_ma else 0.0
 
             resultados[tf] = {
                 "status": "ok",
                 "df": df,
+                "last": last,
+                "cols": cols,
                 "preco": preco,
                 "tendencia": tendencia,
                 "forca": forca,
@@ -417,15 +515,19 @@ def calcular_indicadores_completos(df):
         low = df['low']
         volume = df['volume']
 
-        # Médias móveis múltiplas
-        df['ema9'] = EMAIndicator(close, 9).ema_indicator()
-        df['ema21'] = EMAIndicator(close, 21).ema_indicator()
-        df['ema50'] = EMAIndicator(close, 50).ema_indicator()
-        df['ema200'] = EMAIndicator(close, 200).ema_indicator()
+        c = close.to_numpy(dtype=np.float64)
+        h = high.to_numpy(dtype=np.float64)
+        l = low.to_numpy(dtype=np.float64)
+
+        # Médias móveis múltiplas + EMAs 12/26 do MACD, todas numa só passada por close
+        ema9, ema12, ema21, ema26, ema50, ema200 = _emas_close(
+            c, np.array([9.0, 12.0, 21.0, 26.0, 50.0, 200.0])
+        )
+        df['ema9'], df['ema21'], df['ema50'], df['ema200'] = ema9, ema21, ema50, ema200
         df['sma20'] = SMAIndicator(close, 20).sma_indicator()
 
         # Momentum
-        df['rsi'] = RSIIndicator(close, 14).rsi()
+        df['rsi'] = _rsi_wilder(c, 14)
 
         # StochRSI
         try:
@@ -434,16 +536,23 @@ def calcular_indicadores_completos(df):
         except Exception:
             df['stoch_rsi'] = df['rsi'] / 100.0
 
-        # Tendência
-        macd = MACD(close)
-        df['macd'] = macd.macd()
-        df['macd_signal'] = macd.macd_signal()
-        df['macd_histogram'] = macd.macd_diff()
+        # Tendência (MACD 12/26/9 do ta, montado sobre as EMAs acima)
+        macd = ema12 - ema26
+        macd_signal = np.full(len(macd), np.nan)
+        validos = np.flatnonzero(~np.isnan(macd))
+        if len(validos):
+            # Sinal = EMA 9 do MACD a partir do primeiro valor definido (como o ewm do ta)
+            macd_signal[validos[0]:] = _emas_close(macd[validos[0]:], np.array([9.0]))[0]
+        df['macd'] = macd
+        df['macd_signal'] = macd_signal
+        df['macd_histogram'] = macd - macd_signal
 
-        df['adx'] = ADXIndicator(high, low, close, 14).adx()
+        df['adx'] = calcular_adx(h, l, c, 14)
 
-        # Volatilidade (ATR)
-        df['atr'] = AverageTrueRange(high, low, close, 14).average_true_range()
+        # Volatilidade: ATR 14 e o ATR 10 do Supertrend sobre o mesmo true range
+        atr10, atr14 = _atrs_wilder(h, l, c, np.array([10, 14]))
+        atr14[:13] = 0.0  # o ta devolve zeros (não NaN) antes do 14º candle
+        df['atr'] = atr14
 
         # Bandas de Bollinger
         bollinger = BollingerBands(close, 20, 2)
@@ -477,10 +586,10 @@ def calcular_indicadores_completos(df):
         except Exception:
             df['volume_sma'] = df['volume'].rolling(20, min_periods=1).mean()
 
-        df['obv'] = OnBalanceVolumeIndicator(close, volume).on_balance_volume()
+        df['obv'] = calcular_obv(close.to_numpy(dtype=np.float64), volume.to_numpy(dtype=np.float64))
 
         # Supertrend
-        df = calcular_supertrend(df)
+        df = calcular_supertrend(df, atr=atr10)
 
         # ===== (E) VWAP (opcional) =====
         if os.getenv("ATIVAR_VWAP", "false").lower() == "true":
@@ -502,8 +611,10 @@ def calcular_indicadores_completos(df):
         # Preencher NaN
         for col in df.columns:
             try:
-                if df[col].dtype in ['float64', 'int64'] and df[col].isna().sum() > 0:
-                    df[col] = df[col].fillna(method='bfill').fillna(method='ffill')
+                # Teste direto no array: só colunas float podem ter NaN
+                valores = df[col].to_numpy()
+                if valores.dtype == np.float64 and np.isnan(valores).any():
+                    df[col] = df[col].bfill().ffill()
             except Exception:
                 pass
 
@@ -513,11 +624,9 @@ def calcular_indicadores_completos(df):
         logging.error(f"Erro ao calcular indicadores: {e}")
         return df
 
-def determinar_tendencia(df):
+def determinar_tendencia(r):
     """Determina tendência baseada em múltiplos indicadores"""
     try:
-        r = df.iloc[-1]
-        
         # Critérios de tendência
         ema_score = 0
         if r['ema9'] > r['ema21'] > r['ema50'] > r['ema200']:
@@ -549,10 +658,9 @@ def determinar_tendencia(df):
         logging.warning(f"Erro ao determinar tendência: {e}")
         return "indefinida"
 
-def calcular_forca_tendencia(df):
+def calcular_forca_tendencia(r, cols):
     """Calcula força da tendência (0-10)"""
     try:
-        r = df.iloc[-1]
         pontos = 0
         
         # ADX (0-3 pontos)
@@ -564,7 +672,7 @@ def calcular_forca_tendencia(df):
             pontos += 1
         
         # Volume (0-2 pontos)
-        volume_ratio = df['volume'].iloc[-1] / df['volume'].mean()
+        volume_ratio = r['volume'] / r['volume_media']
         if volume_ratio > 2.0:
             pontos += 2
         elif volume_ratio > 1.3:
@@ -577,15 +685,15 @@ def calcular_forca_tendencia(df):
             pontos += 1
         
         # RSI momentum (0-2 pontos)
-        if len(df) >= 5:
-            rsi_change = df['rsi'].iloc[-1] - df['rsi'].iloc[-5]
+        if len(cols['rsi']) >= 5:
+            rsi_change = cols['rsi'][-1] - cols['rsi'][-5]
             if abs(rsi_change) > 15:
                 pontos += 2
             elif abs(rsi_change) > 8:
                 pontos += 1
         
         # MACD momentum (0-1 ponto)
-        if r['macd'] > r['macd_signal'] and df['macd'].iloc[-1] > df['macd'].iloc[-2]:
+        if r['macd'] > r['macd_signal'] and cols['macd'][-1] > cols['macd'][-2]:
             pontos += 1
         
         return min(pontos, 10)
@@ -594,11 +702,11 @@ def calcular_forca_tendencia(df):
         logging.warning(f"Erro ao calcular força: {e}")
         return 0
 
-def calcular_volatilidade(df):
+def calcular_volatilidade(r):
     """Calcula nível de volatilidade atual"""
     try:
-        atr_atual = df['atr'].iloc[-1]
-        atr_medio = df['atr'].mean()
+        atr_atual = r['atr']
+        atr_medio = r['atr_media']
         
         if atr_atual > atr_medio * 1.5:
             return "alta"
@@ -610,73 +718,238 @@ def calcular_volatilidade(df):
     except Exception as e:
         return "indefinida"
 
-def calcular_supertrend(df, period=10, multiplier=3):
-    """Supertrend com proteções"""
-    try:
-        if pta:
-            st_data = pta.supertrend(df['high'], df['low'], df['close'], length=period, multiplier=multiplier)
-            if st_data is not None and len(st_data.columns) > 1:
-                df['supertrend'] = st_data.iloc[:, 1] > 0
-            else:
-                df['supertrend'] = [True] * len(df)
+@njit(cache=True)
+def _atrs_wilder(high, low, close, periodos):
+    """
+    ATRs de Wilder (mesma semente/recorrência do ta.AverageTrueRange) de vários períodos:
+    o true range é calculado uma vez e cada linha j suaviza com periodos[j]. NaN no aquecimento.
+    """
+    n = len(close)
+    k = len(periodos)
+    atrs = np.full((k, n), np.nan)
+
+    tr = np.empty(n)
+    tr[0] = high[0] - low[0]
+    for i in range(1, n):
+        tr[i] = max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+
+    for j in range(k):
+        period = periodos[j]
+        if n < period:
+            continue
+        atrs[j, period - 1] = tr[:period].mean()
+        for i in range(period, n):
+            atrs[j, i] = (atrs[j, i - 1] * (period - 1) + tr[i]) / period
+    return atrs
+
+@njit(cache=True)
+def _dx_ta(movimento, pos, neg, sementes, periodo):
+    """
+    DX por posição do ta.ADXIndicator: somas de Wilder de true range, +DM e -DM
+    (a partir das sementes) e o índice direcional de cada uma.
+    """
+    m = len(movimento) - (periodo - 1)
+    somas = np.zeros((3, m))
+    somas[:, 0] = sementes
+    for i in range(1, m - 1):  # o ta não preenche a última posição (fica 0)
+        somas[0, i] = somas[0, i - 1] - somas[0, i - 1] / periodo + movimento[periodo + i]
+        somas[1, i] = somas[1, i - 1] - somas[1, i - 1] / periodo + pos[periodo + i]
+        somas[2, i] = somas[2, i - 1] - somas[2, i - 1] / periodo + neg[periodo + i]
+
+    dx = np.zeros(m)
+    for i in range(m):
+        tr = somas[0, i]
+        dip = 100 * (somas[1, i] / tr) if tr != 0 else 0.0
+        din = 100 * (somas[2, i] / tr) if tr != 0 else 0.0
+        if dip + din != 0:
+            dx[i] = 100 * abs((dip - din) / (dip + din))
+    return dx
+
+@njit(cache=True)
+def _adx_ta(dx, media_inicial, periodo):
+    """Suavização final do ADX do ta, já com os zeros do aquecimento na frente"""
+    m = len(dx)
+    inicio = periodo - 1
+    adx = np.zeros(inicio + m)
+    adx[inicio + periodo] = media_inicial
+    for i in range(periodo + 1, m):
+        adx[inicio + i] = (adx[inicio + i - 1] * (periodo - 1) + dx[i - 1]) / periodo
+    return adx
+
+def calcular_adx(high, low, close, periodo=14):
+    """
+    ADX com a mesma conta do ta.ADXIndicator (inclusive zeros no aquecimento),
+    sem os laços sobre Series: vetores em numpy e recorrências nos kernels acima.
+    """
+    n = len(close)
+    if n - (periodo - 1) <= periodo:
+        raise ValueError(f"ADX precisa de mais de {2 * periodo - 1} candles")
+
+    movimento = np.full(n, np.nan)
+    movimento[1:] = np.maximum(high[1:], close[:-1]) - np.minimum(low[1:], close[:-1])
+    sobe = np.zeros(n)
+    desce = np.zeros(n)
+    sobe[1:] = high[1:] - high[:-1]
+    desce[1:] = low[:-1] - low[1:]
+    pos = np.where((sobe > desce) & (sobe > 0), sobe, 0.0)
+    neg = np.where((desce > sobe) & (desce > 0), desce, 0.0)
+
+    # Sementes e média inicial com np.sum/np.mean, como o pandas faz no ta
+    sementes = np.array([
+        movimento[1:periodo + 1].sum(), pos[1:periodo + 1].sum(), neg[1:periodo + 1].sum()
+    ])
+    dx = _dx_ta(movimento, pos, neg, sementes, periodo)
+    return _adx_ta(dx, dx[:periodo].mean(), periodo)
+
+@njit(cache=True)
+def _supertrend_direcao(high, low, close, atr, multiplier):
+    """Direção do Supertrend por candle (True = alta), laço único sobre arrays"""
+    n = len(close)
+    hl2 = (high + low) / 2.0
+    upper = hl2 + multiplier * atr
+    lower = hl2 - multiplier * atr
+
+    alta = np.ones(n, dtype=np.bool_)
+    for i in range(1, n):
+        if close[i] > upper[i - 1]:
+            alta[i] = True
+        elif close[i] < lower[i - 1]:
+            alta[i] = False
         else:
-            atr = AverageTrueRange(df['high'], df['low'], df['close'], period).average_true_range()
-            atr = atr.fillna(method='bfill').fillna(method='ffill')
-            
-            hl2 = (df['high'] + df['low']) / 2
-            lower_band = hl2 - (multiplier * atr)
-            df['supertrend'] = df['close'] > lower_band
-        
+            alta[i] = alta[i - 1]
+            if alta[i] and lower[i] < lower[i - 1]:
+                lower[i] = lower[i - 1]
+            if not alta[i] and upper[i] > upper[i - 1]:
+                upper[i] = upper[i - 1]
+    return alta
+
+def calcular_supertrend(df, period=10, multiplier=3, atr=None):
+    """Supertrend com proteções; atr: ATR de Wilder do período já calculado (opcional)"""
+    try:
+        high = df['high'].to_numpy(dtype=np.float64)
+        low = df['low'].to_numpy(dtype=np.float64)
+        close = df['close'].to_numpy(dtype=np.float64)
+        if atr is None:
+            atr = _atrs_wilder(high, low, close, np.array([period]))[0]
+
+        # Kernel único (compilado com numba; sem numba roda o mesmo laço em Python)
+        df['supertrend'] = _supertrend_direcao(high, low, close, atr, float(multiplier))
         return df
     except Exception as e:
         df['supertrend'] = [True] * len(df)
         return df
 
+@njit(cache=True)
+def _emas_close(close, periodos):
+    """
+    EMAs de vários períodos numa só passada por close (linha j = periodos[j]).
+    Mesma conta do ta (ewm span=n, adjust=False, min_periods=n): NaN antes do n-ésimo candle.
+    """
+    n = len(close)
+    k = len(periodos)
+    saida = np.empty((k, n))
+    alfas = 2.0 / (periodos + 1.0)
+    for j in range(k):
+        saida[j, 0] = close[0]
+    for i in range(1, n):
+        for j in range(k):
+            saida[j, i] = alfas[j] * close[i] + (1.0 - alfas[j]) * saida[j, i - 1]
+    for j in range(k):
+        saida[j, :min(int(periodos[j]) - 1, n)] = np.nan
+    return saida
+
+def calcular_obv(close, volume):
+    """OBV direto em arrays (mesma regra do ta: fechamento igual ao anterior soma o volume)"""
+    sinal = np.ones(len(close))
+    sinal[1:][close[1:] < close[:-1]] = -1.0
+    return np.cumsum(sinal * volume)
+
+@njit(cache=True)
+def _rsi_wilder(close, periodo):
+    """
+    RSI de Wilder numa passada (mesma conta do ta.RSIIndicator: ewm alpha=1/n,
+    adjust=False, primeiro candle com variação 0). NaN antes do n-ésimo candle.
+    """
+    n = len(close)
+    rsi = np.full(n, np.nan)
+    if n == 0:
+        return rsi
+    alfa = 1.0 / periodo
+    peso_antigo = 1.0 - alfa
+    soma_pesos = peso_antigo + alfa
+    media_alta = media_baixa = 0.0
+    for i in range(n):
+        d = close[i] - close[i - 1] if i > 0 else 0.0
+        alta = d if d > 0 else 0.0
+        baixa = -d if d < 0 else 0.0
+        # Mesma atualização do ewm do pandas (inclusive o atalho quando o valor não muda)
+        if media_alta != alta:
+            media_alta = (peso_antigo * media_alta + alfa * alta) / soma_pesos
+        if media_baixa != baixa:
+            media_baixa = (peso_antigo * media_baixa + alfa * baixa) / soma_pesos
+        if i >= periodo - 1:
+            if media_baixa == 0:
+                rsi[i] = 100.0
+            else:
+                rsi[i] = 100.0 - 100.0 / (1.0 + media_alta / media_baixa)
+    return rsi
+
+def rsi_ultimo(close, periodo=14):
+    """
+    Último valor do RSI (Wilder, mesma conta do ta.RSIIndicator) direto sobre
+    o array de fechamentos, sem montar Series. NaN com menos de `periodo` candles.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    if len(close) < periodo:
+        return np.nan
+    return float(_rsi_wilder(close, periodo)[-1])
+
 # ===============================
 # === DETECÇÃO DE PADRÕES
 # ===============================
 
-def detectar_candle_forte(df):
-    if len(df) < 2:
-        return False
+@njit(cache=True)
+def _padroes_candle(o1, c1, o2, h2, l2, c2):
+    """(candle forte, engolfo de alta, martelo) do último candle, só aritmética"""
+    corpo = abs(c2 - o2)
+    sombra_sup = h2 - max(c2, o2)
+    sombra_inf = min(c2, o2) - l2
+    forte = corpo > 0 and corpo > sombra_sup and corpo > sombra_inf
+    engolfo = c2 > o2 and c1 < o1 and o2 < c1 and c2 > o1
+    martelo = corpo > 0 and sombra_inf > corpo * 2 and sombra_sup < corpo
+    return forte, engolfo, martelo
+
+def detectar_padroes_candle(cols):
+    """Padrões dos dois últimos candles numa passada; NaN ou < 2 candles dão False"""
+    if len(cols['close']) < 2:
+        return False, False, False
+    o, h, l, c = cols['open'], cols['high'], cols['low'], cols['close']
     try:
-        candle = df.iloc[-1]
-        if pd.isna([candle['open'], candle['high'], candle['low'], candle['close']]).any():
-            return False
-        
-        corpo = abs(candle['close'] - candle['open'])
-        sombra_sup = candle['high'] - max(candle['close'], candle['open'])
-        sombra_inf = min(candle['close'], candle['open']) - candle['low']
-        
-        if corpo == 0:
-            return False
-        
-        return corpo > sombra_sup and corpo > sombra_inf
-    except:
-        return False
+        forte, engolfo, martelo = _padroes_candle(o[-2], c[-2], o[-1], h[-1], l[-1], c[-1])
+        return bool(forte), bool(engolfo), bool(martelo)
+    except Exception:
+        return False, False, False
+
+# Interface antiga por DataFrame, mantida para quem ainda chama um padrão isolado
+def _padroes_df(df):
+    return detectar_padroes_candle({k: df[k].to_numpy(dtype=np.float64) for k in ('open', 'high', 'low', 'close')})
+
+def detectar_candle_forte(df):
+    return _padroes_df(df)[0]
 
 def detectar_engolfo_alta(df):
-    if len(df) < 2:
-        return False
-    try:
-        c1, c2 = df.iloc[-2], df.iloc[-1]
-        return (c2['close'] > c2['open'] and c1['close'] < c1['open'] and
-                c2['open'] < c1['close'] and c2['close'] > c1['open'])
-    except:
-        return False
+    return _padroes_df(df)[1]
 
 def detectar_martelo(df):
-    if len(df) < 1:
-        return False
-    try:
-        c = df.iloc[-1]
-        corpo = abs(c['close'] - c['open'])
-        sombra_inf = min(c['close'], c['open']) - c['low']
-        sombra_sup = c['high'] - max(c['close'], c['open'])
-        
-        return corpo > 0 and sombra_inf > corpo * 2 and sombra_sup < corpo
-    except:
-        return False
+    return _padroes_df(df)[2]
+
+def _extremos_locais(valores, func):
+    """Máscara de extremos locais em janela 3 centrada (equivale a rolling(3, center=True))."""
+    mask = np.zeros(len(valores), dtype=bool)
+    if len(valores) >= 3:
+        janela = func(func(valores[:-2], valores[1:-1]), valores[2:])
+        mask[1:-1] = janela == valores[1:-1]
+    return mask
 
 # ===============================
 # === SETUPS AVANÇADOS
@@ -730,121 +1003,127 @@ def verificar_confluencia_timeframes(analise_tf, par):
     
     return None
 
-def verificar_squeeze_bollinger(r, df):
+SETUP_SQUEEZE_BOLLINGER = {
+    'setup': '🎪 BOLLINGER SQUEEZE',
+    'prioridade': '🟣 EXPLOSÃO IMINENTE',
+    'emoji': '🎪',
+    'id': 'bollinger_squeeze',
+    'score_base': 8.5
+}
+
+def verificar_squeeze_bollinger(r, cols):
     """Setup: Bollinger Band Squeeze"""
     try:
-        if 'bb_upper' not in df.columns:
-            bollinger = BollingerBands(df['close'], 20, 2)
-            df['bb_upper'] = bollinger.bollinger_hband()
-            df['bb_lower'] = bollinger.bollinger_lband()
-            df['bb_middle'] = bollinger.bollinger_mavg()
+        # Critérios baratos primeiro; a largura média das bandas (array) fica por último
         
-        # Largura das bandas
-        bb_width = (r['bb_upper'] - r['bb_lower']) / r['bb_middle']
-        bb_width_avg = ((df['bb_upper'] - df['bb_lower']) / df['bb_middle']).rolling(20).mean().iloc[-1]
-        
-        # Squeeze ativo
-        squeeze_ativo = bb_width < bb_width_avg * 0.6
+        # ADX baixo
+        if not r['adx'] < 20:
+            return None
         
         # Preço próximo a banda
         dist_upper = abs(r['close'] - r['bb_upper']) / r['close']
         dist_lower = abs(r['close'] - r['bb_lower']) / r['close']
-        proximo_banda = min(dist_upper, dist_lower) < 0.015
+        if not min(dist_upper, dist_lower) < 0.015:
+            return None
         
         # Volume crescente
-        volume_crescente = df['volume'].iloc[-3:].mean() > df['volume'].iloc[-6:-3].mean()
+        volume = cols['volume']
+        if not volume[-3:].mean() > volume[-6:-3].mean():
+            return None
         
-        # ADX baixo
-        adx_baixo = r['adx'] < 20
+        # Squeeze ativo (largura atual vs. média das últimas 20)
+        bb_width = (r['bb_upper'] - r['bb_lower']) / r['bb_middle']
+        larguras = (cols['bb_upper'] - cols['bb_lower']) / cols['bb_middle']
+        bb_width_avg = larguras[-20:].mean()
         
-        if squeeze_ativo and proximo_banda and volume_crescente and adx_baixo:
-            return {
-                'setup': '🎪 BOLLINGER SQUEEZE',
-                'prioridade': '🟣 EXPLOSÃO IMINENTE',
-                'emoji': '🎪',
-                'id': 'bollinger_squeeze',
-                'score_base': 8.5
-            }
+        if bb_width < bb_width_avg * 0.6:
+            return SETUP_SQUEEZE_BOLLINGER
             
     except Exception as e:
         logging.warning(f"Erro no Bollinger Squeeze: {e}")
     
     return None
 
-def verificar_divergencia_rsi(df):
+SETUP_DIVERGENCIA_BEARISH = {
+    'setup': '📉 DIVERGÊNCIA RSI BEARISH',
+    'prioridade': '🟡 REVERSÃO POTENCIAL',
+    'emoji': '📉',
+    'id': 'divergencia_rsi',
+    'score_base': 7.5
+}
+
+SETUP_DIVERGENCIA_BULLISH = {
+    'setup': '📈 DIVERGÊNCIA RSI BULLISH',
+    'prioridade': '🟢 REVERSÃO ALTA PROVÁVEL',
+    'emoji': '📈',
+    'id': 'divergencia_rsi_bullish',
+    'score_base': 8.0
+}
+
+def verificar_divergencia_rsi(r, cols):
     """Setup: Divergência RSI"""
     try:
-        if len(df) < 30:
+        if len(cols['close']) < 30:
             return None
         
-        recent = df.tail(20).copy()
+        high = cols['high'][-20:]
+        low = cols['low'][-20:]
+        rsi = cols['rsi'][-20:]
         
         # Encontrar picos
-        recent['price_peak'] = recent['high'].rolling(3, center=True).max() == recent['high']
-        recent['rsi_peak'] = recent['rsi'].rolling(3, center=True).max() == recent['rsi']
-        
-        price_peaks = recent[recent['price_peak']]['high']
-        rsi_peaks = recent[recent['rsi_peak']]['rsi']
+        price_peaks = high[_extremos_locais(high, np.maximum)]
+        rsi_peaks = rsi[_extremos_locais(rsi, np.maximum)]
         
         if len(price_peaks) >= 2 and len(rsi_peaks) >= 2:
             # Divergência bearish
-            price_trend = price_peaks.iloc[-1] > price_peaks.iloc[-2]
-            rsi_trend = rsi_peaks.iloc[-1] < rsi_peaks.iloc[-2]
-            rsi_overbought = rsi_peaks.iloc[-1] > 65
+            price_trend = price_peaks[-1] > price_peaks[-2]
+            rsi_trend = rsi_peaks[-1] < rsi_peaks[-2]
+            rsi_overbought = rsi_peaks[-1] > 65
             
             if price_trend and rsi_trend and rsi_overbought:
-                return {
-                    'setup': '📉 DIVERGÊNCIA RSI BEARISH',
-                    'prioridade': '🟡 REVERSÃO POTENCIAL',
-                    'emoji': '📉',
-                    'id': 'divergencia_rsi',
-                    'score_base': 7.5
-                }
+                return SETUP_DIVERGENCIA_BEARISH
         
         # Divergência bullish
-        price_lows = recent[recent['low'].rolling(3, center=True).min() == recent['low']]['low']
-        rsi_lows = recent[recent['rsi'].rolling(3, center=True).min() == recent['rsi']]['rsi']
+        price_lows = low[_extremos_locais(low, np.minimum)]
+        rsi_lows = rsi[_extremos_locais(rsi, np.minimum)]
         
         if len(price_lows) >= 2 and len(rsi_lows) >= 2:
-            price_trend_down = price_lows.iloc[-1] < price_lows.iloc[-2]
-            rsi_trend_up = rsi_lows.iloc[-1] > rsi_lows.iloc[-2]
-            rsi_oversold = rsi_lows.iloc[-1] < 35
+            price_trend_down = price_lows[-1] < price_lows[-2]
+            rsi_trend_up = rsi_lows[-1] > rsi_lows[-2]
+            rsi_oversold = rsi_lows[-1] < 35
             
             if price_trend_down and rsi_trend_up and rsi_oversold:
-                return {
-                    'setup': '📈 DIVERGÊNCIA RSI BULLISH',
-                    'prioridade': '🟢 REVERSÃO ALTA PROVÁVEL',
-                    'emoji': '📈',
-                    'id': 'divergencia_rsi_bullish',
-                    'score_base': 8.0
-                }
+                return SETUP_DIVERGENCIA_BULLISH
                 
     except Exception as e:
         logging.warning(f"Erro na divergência RSI: {e}")
     
     return None
 
-def verificar_breakout_volume_avancado(r, df):
+def verificar_breakout_volume_avancado(r, cols):
     """Setup: Breakout com volume extremo"""
     try:
-        if len(df) < 20:
+        if len(cols['close']) < 20:
+            return None
+        
+        # Critérios escalares primeiro (volume 3x a média descarta quase todos os candles)
+        volume_explosivo = r['volume'] > r['volume_media'] * 3.0
+        rsi_saudavel = 40 < r['rsi'] < 75
+        macd_confirmando = r['macd'] > r['macd_signal']
+        if not (volume_explosivo and rsi_saudavel and macd_confirmando):
             return None
         
         # Resistência dos últimos 15 candles
-        resistencia = df['high'].iloc[-15:-1].max()
+        maximas = cols['high'][-15:-1]
+        resistencia = maximas.max()
+        if not r['close'] > resistencia * 1.002:
+            return None
         
         # Contar toques na resistência
-        touches = ((df['high'].iloc[-15:-1] >= resistencia * 0.995) & 
-                  (df['high'].iloc[-15:-1] <= resistencia * 1.005)).sum()
+        touches = ((maximas >= resistencia * 0.995) &
+                  (maximas <= resistencia * 1.005)).sum()
         
-        # Critérios
-        resistencia_forte = touches >= 3
-        breakout = r['close'] > resistencia * 1.002
-        volume_explosivo = df['volume'].iloc[-1] > df['volume'].mean() * 3.0
-        rsi_saudavel = 40 < r['rsi'] < 75
-        macd_confirmando = r['macd'] > r['macd_signal']
-        
-        if resistencia_forte and breakout and volume_explosivo and rsi_saudavel and macd_confirmando:
+        if touches >= 3:
             return {
                 'setup': '💥 BREAKOUT VOLUME EXTREMO',
                 'prioridade': '🔴 ALTA PROBABILIDADE',
@@ -863,143 +1142,153 @@ def verificar_breakout_volume_avancado(r, df):
 # === SETUPS ORIGINAIS
 # ===============================
 
-def verificar_setup_rigoroso(r, df):
+SETUP_RIGOROSO = {
+    'setup': '🎯 SETUP RIGOROSO',
+    'prioridade': '🟠 PRIORIDADE ALTA',
+    'emoji': '🎯',
+    'id': 'setup_rigoroso'
+}
+
+def verificar_setup_rigoroso(r, cols):
     try:
         campos = ['rsi', 'ema9', 'ema21', 'macd', 'macd_signal', 'adx']
         if any(pd.isna(r[campo]) for campo in campos):
             return None
         
-        condicoes = [
-            r['rsi'] < 40,
-            df['ema9'].iloc[-2] < df['ema21'].iloc[-2] and r['ema9'] > r['ema21'],
-            r['macd'] > r['macd_signal'],
-            r['adx'] > 20,
-            df['volume'].iloc[-1] > df['volume'].mean() * 1.5,
-            df['supertrend'].iloc[-1] == True
-        ]
+        # Todos os critérios são obrigatórios: o mais seletivo (RSI < 40) vem primeiro
+        if not r['rsi'] < 40:
+            return None
+        if not r['volume'] > r['volume_media'] * 1.5:
+            return None
+        if not (r['macd'] > r['macd_signal'] and r['adx'] > 20 and r['supertrend'] == True):
+            return None
+        if not (cols['ema9'][-2] < cols['ema21'][-2] and r['ema9'] > r['ema21']):
+            return None
         
-        if all(condicoes):
-            return {
-                'setup': '🎯 SETUP RIGOROSO', 
-                'prioridade': '🟠 PRIORIDADE ALTA', 
-                'emoji': '🎯',
-                'id': 'setup_rigoroso'
-            }
+        return SETUP_RIGOROSO
     except:
         pass
     return None
 
-def verificar_setup_alta_confluencia(r, df):
+SETUP_ALTA_CONFLUENCIA = {
+    'setup': '🔥 SETUP ALTA CONFLUÊNCIA',
+    'prioridade': '🟥 PRIORIDADE MÁXIMA',
+    'emoji': '🔥',
+    'id': 'setup_alta_confluencia'
+}
+
+def verificar_setup_alta_confluencia(r, cols):
     try:
         condicoes = [
             r['rsi'] < 40,
-            df['ema9'].iloc[-2] < df['ema21'].iloc[-2] and r['ema9'] > r['ema21'],
+            cols['ema9'][-2] < cols['ema21'][-2] and r['ema9'] > r['ema21'],
             r['macd'] > r['macd_signal'],
-            r['atr'] > df['atr'].mean(),
-            r['obv'] > df['obv'].mean(),
+            r['atr'] > r['atr_media'],
+            r['obv'] > r['obv_media'],
             r['adx'] > 20,
             r['close'] > r['ema200'],
-            df['volume'].iloc[-1] > df['volume'].mean(),
-            df['supertrend'].iloc[-1],
-            detectar_candle_forte(df)
+            r['volume'] > r['volume_media'],
+            r['supertrend'],
+            r['candle_forte']
         ]
         
         if sum(condicoes) >= 6:
-            return {
-                'setup': '🔥 SETUP ALTA CONFLUÊNCIA',
-                'prioridade': '🟥 PRIORIDADE MÁXIMA',
-                'emoji': '🔥',
-                'id': 'setup_alta_confluencia'
-            }
+            return SETUP_ALTA_CONFLUENCIA
     except:
         pass
     return None
 
-def verificar_setup_rompimento(r, df):
-    if len(df) < 10:
+SETUP_ROMPIMENTO = {
+    'setup': '🚀 SETUP ROMPIMENTO',
+    'prioridade': '🟩 ALTA OPORTUNIDADE',
+    'emoji': '🚀',
+    'id': 'setup_rompimento'
+}
+
+def verificar_setup_rompimento(r, cols):
+    if len(cols['close']) < 10:
         return None
     try:
-        resistencia = df['high'].iloc[-10:-1].max()
+        resistencia = r['resistencia_10']
         if pd.isna(resistencia):
             return None
-            
-        condicoes = [
-            r['close'] > resistencia,
-            df['volume'].iloc[-1] > df['volume'].mean(),
-            r['rsi'] > 55 and df['rsi'].iloc[-1] > df['rsi'].iloc[-2],
-            df['supertrend'].iloc[-1]
-        ]
         
-        if all(condicoes):
-            return {
-                'setup': '🚀 SETUP ROMPIMENTO',
-                'prioridade': '🟩 ALTA OPORTUNIDADE',
-                'emoji': '🚀',
-                'id': 'setup_rompimento'
-            }
+        # Critérios obrigatórios, do mais seletivo ao menos
+        if not r['close'] > resistencia:
+            return None
+        if not (r['rsi'] > 55 and cols['rsi'][-1] > cols['rsi'][-2]):
+            return None
+        if not (r['volume'] > r['volume_media'] and r['supertrend']):
+            return None
+        
+        return SETUP_ROMPIMENTO
     except:
         pass
     return None
 
-def verificar_setup_reversao_tecnica(r, df):
-    if len(df) < 3:
+SETUP_REVERSAO_TECNICA = {
+    'setup': '🔁 SETUP REVERSÃO TÉCNICA',
+    'prioridade': '🟣 OPORTUNIDADE DE REVERSÃO',
+    'emoji': '🔁',
+    'id': 'setup_reversao_tecnica'
+}
+
+def verificar_setup_reversao_tecnica(r, cols):
+    if len(cols['close']) < 3:
         return None
     try:
-        condicoes = [
-            r['obv'] > df['obv'].mean(),
-            df['close'].iloc[-2] > df['open'].iloc[-2],
-            df['close'].iloc[-1] > df['close'].iloc[-2],
-            detectar_martelo(df) or detectar_engolfo_alta(df),
-            df['rsi'].iloc[-1] > df['rsi'].iloc[-2]
-        ]
+        # Padrão de candle (martelo/engolfo) é o filtro mais raro: sai cedo sem ele
+        if not (r['martelo'] or r['engolfo_alta']):
+            return None
+        if not (cols['close'][-2] > cols['open'][-2] and cols['close'][-1] > cols['close'][-2]):
+            return None
+        if not (r['obv'] > r['obv_media'] and cols['rsi'][-1] > cols['rsi'][-2]):
+            return None
         
-        if all(condicoes):
-            return {
-                'setup': '🔁 SETUP REVERSÃO TÉCNICA',
-                'prioridade': '🟣 OPORTUNIDADE DE REVERSÃO',
-                'emoji': '🔁',
-                'id': 'setup_reversao_tecnica'
-            }
+        return SETUP_REVERSAO_TECNICA
     except:
         pass
     return None
 
-def verificar_setup_intermediario(r, df):
+SETUP_INTERMEDIARIO = {
+    'setup': '⚙️ SETUP INTERMEDIÁRIO',
+    'prioridade': '🟡 PRIORIDADE MÉDIA-ALTA',
+    'emoji': '⚙️',
+    'id': 'setup_intermediario'
+}
+
+def verificar_setup_intermediario(r, cols):
     try:
-        condicoes = [
-            r['rsi'] < 50,
-            r['ema9'] > r['ema21'],
-            r['macd'] > r['macd_signal'],
-            r['adx'] > 15,
-            df['volume'].iloc[-1] > df['volume'].mean()
-        ]
+        # Critérios obrigatórios avaliados em cascata
+        if not (r['rsi'] < 50 and r['ema9'] > r['ema21']):
+            return None
+        if not (r['macd'] > r['macd_signal'] and r['adx'] > 15):
+            return None
+        if not r['volume'] > r['volume_media']:
+            return None
         
-        if all(condicoes):
-            return {
-                'setup': '⚙️ SETUP INTERMEDIÁRIO',
-                'prioridade': '🟡 PRIORIDADE MÉDIA-ALTA',
-                'emoji': '⚙️',
-                'id': 'setup_intermediario'
-            }
+        return SETUP_INTERMEDIARIO
     except:
         pass
     return None
 
-def verificar_setup_leve(r, df):
+SETUP_LEVE = {
+    'setup': '🔹 SETUP LEVE',
+    'prioridade': '🔵 PRIORIDADE MÉDIA',
+    'emoji': '🔹',
+    'id': 'setup_leve'
+}
+
+def verificar_setup_leve(r, cols):
     try:
         condicoes = [
             r['ema9'] > r['ema21'],
             r['adx'] > 15,
-            df['volume'].iloc[-1] > df['volume'].mean()
+            r['volume'] > r['volume_media']
         ]
         
         if sum(condicoes) >= 2:
-            return {
-                'setup': '🔹 SETUP LEVE',
-                'prioridade': '🔵 PRIORIDADE MÉDIA',
-                'emoji': '🔹',
-                'id': 'setup_leve'
-            }
+            return SETUP_LEVE
     except:
         pass
     return None
@@ -1038,29 +1327,28 @@ def calcular_score_avancado(analise_tf, setup_info):
     """Score avançado considerando múltiplos timeframes"""
     try:
         score_base = setup_info.get('score_base', 7.0)
-        bonus = 0
-        criterios = []
-        
-        # Bonus por confluência de timeframes
-        if len(analise_tf) > 1:
-            tendencias = [tf['tendencia'] for tf in analise_tf.values() if tf.get('status') == 'ok']
-            if len(set(tendencias)) == 1 and tendencias[0] in ['alta', 'alta_forte']:
-                bonus += 1.0
-                criterios.append("✅ Confluência entre timeframes")
-            else:
-                criterios.append("❌ Timeframes divergentes")
-        
-        # Bonus por força geral
-        forcas = [tf['forca'] for tf in analise_tf.values() if tf.get('status') == 'ok']
-        if forcas and min(forcas) >= 6:
-            bonus += 0.5
-            criterios.append("✅ Força consistente")
+        validos = [tf for tf in analise_tf.values() if tf.get('status') == 'ok']
+        tendencias = {tf['tendencia'] for tf in validos}
+        forcas = [tf['forca'] for tf in validos]
+        volatilidades = {tf['volatilidade'] for tf in validos}
+        multi_tf = len(analise_tf) > 1
+        
+        # (condição, peso, texto se atendida, texto se não atendida; None = não lista)
+        tabela = [
+            # Confluência de timeframes (só avaliada com mais de um TF)
+            (multi_tf and len(tendencias) == 1 and tendencias <= {'alta', 'alta_forte'}, 1.0,
+             "✅ Confluência entre timeframes",
+             "❌ Timeframes divergentes" if multi_tf else None),
+            # Força geral
+            (bool(forcas) and min(forcas) >= 6, 0.5, "✅ Força consistente", None),
+            # Volatilidade adequada
+            (bool(volatilidades & {'normal', 'alta'}), 0.3, "✅ Volatilidade adequada", None),
+        ]
         
-        # Bonus por volatilidade adequada
-        volatilidades = [tf['volatilidade'] for tf in analise_tf.values() if tf.get('status') == 'ok']
-        if 'normal' in volatilidades or 'alta' in volatilidades:
-            bonus += 0.3
-            criterios.append("✅ Volatilidade adequada")
+        bonus = sum(peso for ok, peso, _, _ in tabela if ok)
+        criterios = [texto_ok if ok else texto_falha
+                     for ok, _, texto_ok, texto_falha in tabela
+                     if (texto_ok if ok else texto_falha)]
         
         score_final = min(score_base + bonus, 10.0)
         return score_final, criterios
@@ -1072,22 +1360,107 @@ def calcular_score_avancado(analise_tf, setup_info):
 # === GESTÃO DE SINAIS
 # ===============================
 
-def carregar_sinais_monitorados():
+def ler_json(caminho):
+    """Lê um arquivo JSON (orjson quando disponível)"""
+    if orjson is not None:
+        with open(caminho, 'rb') as f:
+            conteudo = f.read()
+        try:
+            return orjson.loads(conteudo)
+        except orjson.JSONDecodeError:
+            # Arquivos antigos podem conter NaN/Infinity (aceitos só pela stdlib)
+            return json.loads(conteudo)
+    with open(caminho, 'r') as f:
+        return json.load(f)
+
+def gravar_json(caminho, dados):
+    """Grava um arquivo JSON indentado (orjson quando disponível); escrita atômica via .tmp"""
+    tmp = caminho + '.tmp'
+    if orjson is not None:
+        with open(tmp, 'wb') as f:
+            f.write(orjson.dumps(dados, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(tmp, 'w') as f:
+            json.dump(dados, f, indent=2)
+    os.replace(tmp, caminho)
+
+def _epoch_registro(registro):
+    """
+    Epoch (s) de um registro de sinal/análise. Usa o campo 'ts' quando existe;
+    registros antigos caem no ISO de 'timestamp' (gravado em UTC).
+    """
+    ts = registro.get('ts')
+    if ts is None:
+        dt = datetime.datetime.fromisoformat(registro['timestamp'])
+        ts = dt.replace(tzinfo=datetime.timezone.utc).timestamp()
+    return ts
+
+def ler_jsonl(caminho):
+    """Lista de registros de um arquivo JSONL (um JSON por linha); [] se não existe"""
     try:
-        with open(ARQUIVO_SINAIS_MONITORADOS, 'r') as f:
-            return json.load(f)
+        with open(caminho, 'rb') as f:
+            return [(orjson.loads(l) if orjson is not None else json.loads(l)) for l in f if l.strip()]
     except FileNotFoundError:
         return []
 
+def anexar_jsonl(caminho, registros):
+    """Acrescenta registros ao fim de um arquivo JSONL"""
+    if orjson is not None:
+        dados = b''.join(orjson.dumps(r, option=orjson.OPT_SERIALIZE_NUMPY) + b'\n' for r in registros)
+    else:
+        dados = ''.join(json.dumps(r) + '\n' for r in registros).encode()
+    with open(caminho, 'ab') as f:
+        f.write(dados)
+
+# Sinais ficam em memória durante o ciclo e são gravados uma vez por _flush_sinais().
+# Sinais novos vão para o JSONL (append); o snapshot só é regravado quando algum status muda.
+_sinais_cache = None
+_sinais_dirty = False
+_sinais_novos = []
+
+def carregar_sinais_monitorados():
+    global _sinais_cache
+    if _sinais_cache is None:
+        try:
+            _sinais_cache = ler_json(ARQUIVO_SINAIS_MONITORADOS)
+        except FileNotFoundError:
+            _sinais_cache = []
+        _sinais_cache.extend(ler_jsonl(ARQUIVO_SINAIS_NOVOS))
+    return _sinais_cache
+
 def salvar_sinais_monitorados(sinais):
-    with open(ARQUIVO_SINAIS_MONITORADOS, 'w') as f:
-        json.dump(sinais, f, indent=2)
+    """Marca os sinais como alterados; a gravação fica para _flush_sinais()"""
+    global _sinais_cache, _sinais_dirty
+    _sinais_cache = sinais
+    _sinais_dirty = True
 
-def registrar_sinal_monitorado(par, setup_id, preco_entrada, alvo, stop, score_100=None):
+def _flush_sinais():
+    """
+    Persiste o que mudou desde a última gravação: com mudança de status regrava o
+    snapshot (e zera o JSONL); só com sinais novos, apenas anexa as linhas deles.
     """
-    Registra um sinal em dados/sinais_monitorados.json.
+    global _sinais_dirty
+    if _sinais_cache is None:
+        return
+    if _sinais_dirty:
+        gravar_json(ARQUIVO_SINAIS_MONITORADOS, _sinais_cache)
+        if os.path.exists(ARQUIVO_SINAIS_NOVOS):
+            os.remove(ARQUIVO_SINAIS_NOVOS)
+        _sinais_dirty = False
+    elif _sinais_novos:
+        anexar_jsonl(ARQUIVO_SINAIS_NOVOS, _sinais_novos)
+    _sinais_novos.clear()
+
+# Saída por caminho que não passou pelo flush (sys.exit, erro fora do try) ainda grava
+atexit.register(_flush_sinais)
+
+def registrar_sinal_monitorado(par, setup_id, preco_entrada, alvo, stop, score_100=None, agora=None):
+    """
+    Registra um sinal (anexado em sinais_monitorados.jsonl no próximo flush).
     Compatível com a versão anterior; o campo score_100 é OPCIONAL.
+    agora: instante (UTC) do ciclo; sem ele usa o relógio atual.
     """
+    agora = agora or datetime.datetime.utcnow()
     sinais = carregar_sinais_monitorados()
     novo_sinal = {
         "par": par,
@@ -1095,7 +1468,8 @@ def registrar_sinal_monitorado(par, setup_id, preco_entrada, alvo, stop, score_1
         "entrada": preco_entrada,
         "alvo": alvo,
         "stop": stop,
-        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "timestamp": agora.isoformat(),
+        "ts": agora.replace(tzinfo=datetime.timezone.utc).timestamp(),
         "status": "em_aberto"
     }
     if score_100 is not None:
@@ -1105,49 +1479,83 @@ def registrar_sinal_monitorado(par, setup_id, preco_entrada, alvo, stop, score_1
             novo_sinal["score_100"] = score_100
 
     sinais.append(novo_sinal)
-    salvar_sinais_monitorados(sinais)
+    _sinais_novos.append(novo_sinal)
     print(f"📝 Sinal registrado: {par} - {setup_id}")
 
+def buscar_precos_atuais(exchange, pares):
+    """
+    Último preço de cada par numa única chamada (fetch_tickers).
+    Se a exchange não suportar ou a chamada falhar, consulta par a par.
+    Pares sem cotação ficam fora do dict retornado.
+    """
+    precos = {}
+    if not pares:
+        return precos
+
+    try:
+        tickers = exchange.fetch_tickers(list(pares))
+        for par in pares:
+            ticker = tickers.get(par)
+            if ticker and ticker.get('last') is not None:
+                precos[par] = ticker['last']
+        return precos
+    except ccxt.NotSupported:
+        pass
+    except Exception as e:
+        logging.warning(f"fetch_tickers falhou (consultando par a par): {e}")
+
+    for par in pares:
+        try:
+            precos[par] = exchange.fetch_ticker(par)['last']
+        except Exception:
+            continue
+    return precos
+
 def verificar_sinais_monitorados(exchange):
     """Verifica sinais em aberto"""
     sinais = carregar_sinais_monitorados()
     sinais_atualizados = []
     
-    for sinal in sinais:
-        if sinal['status'] != "em_aberto":
-            continue
-            
-        par = sinal['par']
-        try:
-            ticker = exchange.fetch_ticker(par)
-            preco_atual = ticker['last']
-        except Exception as e:
-            continue
-        
-        status_anterior = sinal['status']
-        
-        if preco_atual >= sinal['alvo']:
-            sinal['status'] = "🎯 Alvo atingido"
-            sinal['preco_final'] = preco_atual
-        elif preco_atual <= sinal['stop']:
-            sinal['status'] = "🛑 Stop atingido"
-            sinal['preco_final'] = preco_atual
-        else:
-            dt_alerta = datetime.datetime.fromisoformat(sinal['timestamp'])
-            tempo_passado = datetime.datetime.utcnow() - dt_alerta
-            if tempo_passado.total_seconds() >= 86400:
+    # Uma ida à exchange para todos os pares com sinal em aberto
+    pares_abertos = {s['par'] for s in sinais if s['status'] == "em_aberto"}
+    precos = buscar_precos_atuais(exchange, pares_abertos)
+    
+    # Um único instante para todo o lote (mesmo carimbo em todas as atualizações)
+    agora = datetime.datetime.utcnow()
+    agora_ts = agora.replace(tzinfo=datetime.timezone.utc).timestamp()
+    agora_iso = agora.isoformat()
+    
+    abertos = [s for s in sinais if s['status'] == "em_aberto" and precos.get(s['par']) is not None]
+    if abertos:
+        # Uma passada vetorizada decide as transições; Python só percorre quem mudou
+        n = len(abertos)
+        preco = np.fromiter((precos[s['par']] for s in abertos), dtype=np.float64, count=n)
+        alvo = np.fromiter((s['alvo'] for s in abertos), dtype=np.float64, count=n)
+        stop = np.fromiter((s['stop'] for s in abertos), dtype=np.float64, count=n)
+        registro = np.fromiter((_epoch_registro(s) for s in abertos), dtype=np.float64, count=n)
+        
+        hit_alvo = preco >= alvo
+        hit_stop = ~hit_alvo & (preco <= stop)
+        expirado = ~hit_alvo & ~hit_stop & ((agora_ts - registro) >= 86400)
+        
+        for i in np.flatnonzero(hit_alvo | hit_stop | expirado):
+            sinal = abertos[i]
+            if hit_alvo[i]:
+                sinal['status'] = "🎯 Alvo atingido"
+            elif hit_stop[i]:
+                sinal['status'] = "🛑 Stop atingido"
+            else:
                 sinal['status'] = "⏰ Expirado (24h)"
-                sinal['preco_final'] = preco_atual
-        
-        if sinal['status'] != status_anterior:
-            sinal['atualizado_em'] = datetime.datetime.utcnow().isoformat()
+            sinal['preco_final'] = precos[sinal['par']]
+            sinal['atualizado_em'] = agora_iso
             sinais_atualizados.append(sinal)
     
     if sinais_atualizados:
         salvar_sinais_monitorados(sinais)
         for sinal in sinais_atualizados:
-            enviar_notificacao_fechamento(sinal)
+            enviar_em_segundo_plano(enviar_notificacao_fechamento, sinal)
     
+    _flush_sinais()
     return sinais_atualizados
 
 def enviar_notificacao_fechamento(sinal):
@@ -1180,27 +1588,48 @@ def enviar_notificacao_fechamento(sinal):
 # === DADOS FUNDAMENTAIS
 # ===============================
 
+# (limite, sufixo) em ordem decrescente
+ESCALAS_VALOR = ((1e12, "T"), (1e9, "B"), (1e6, "M"))
+
 def abreviar_valor(valor):
-    if valor >= 1_000_000_000_000:
-        return f"${valor/1_000_000_000_000:.2f}T"
-    elif valor >= 1_000_000_000:
-        return f"${valor/1_000_000_000:.2f}B"
-    elif valor >= 1_000_000:
-        return f"${valor/1_000_000:.2f}M"
-    else:
-        return f"${valor:,.2f}"
+    for limite, sufixo in ESCALAS_VALOR:
+        if valor >= limite:
+            return f"${valor/limite:.2f}{sufixo}"
+    return f"${valor:,.2f}"
+
+def valor_em(dados, caminho, padrao=None):
+    """Valor em dados[k1][k2]...; padrao se alguma chave faltar"""
+    try:
+        return functools.reduce(operator.getitem, caminho, dados)
+    except (KeyError, IndexError, TypeError):
+        return padrao
+
+# Janela (s) em que o contexto macro é reaproveitado entre alertas
+JANELA_CACHE_FUNDAMENTAIS = 300
+_cache_fundamentais = {'ts': 0.0, 'texto': None}
 
 def obter_dados_fundamentais():
+    """Contexto macro com cache de 5 min; falhas não entram no cache (o próximo alerta tenta de novo)"""
+    agora = time.time()
+    if _cache_fundamentais['texto'] is not None and agora - _cache_fundamentais['ts'] < JANELA_CACHE_FUNDAMENTAIS:
+        return _cache_fundamentais['texto']
+
+    texto, ok = _obter_dados_fundamentais_api()
+    if ok:
+        _cache_fundamentais['ts'] = agora
+        _cache_fundamentais['texto'] = texto
+    return texto
+
+def _obter_dados_fundamentais_api():
+    """Retorna (texto, ok); ok=False quando a API falhou ou veio incompleta"""
     try:
-        total = requests.get("https://api.coingecko.com/api/v3/global", timeout=5).json()
-        market_data = total.get('data', {})
-        
-        market_cap = market_data.get('total_market_cap', {}).get('usd')
-        market_cap_change = market_data.get('market_cap_change_percentage_24h_usd', 0)
-        btc_dominance = market_data.get('market_cap_percentage', {}).get('btc')
+        total = obter_json("https://api.coingecko.com/api/v3/global", timeout=5)
+        market_cap = valor_em(total, ('data', 'total_market_cap', 'usd'))
+        market_cap_change = valor_em(total, ('data', 'market_cap_change_percentage_24h_usd'), 0)
+        btc_dominance = valor_em(total, ('data', 'market_cap_percentage', 'btc'))
         
         if market_cap is None or btc_dominance is None:
-            return "*Dados fundamentais indisponíveis*"
+            return "*Dados fundamentais indisponíveis*", False
         
         emoji_cap = "📈" if market_cap_change >= 0 else "📉"
         
@@ -1213,7 +1642,7 @@ def obter_dados_fundamentais():
         
         # Fear & Greed Index
         try:
-            fg_response = requests.get("https://api.alternative.me/fng/?limit=1", timeout=3).json()
+            fg_response = obter_json("https://api.alternative.me/fng/?limit=1", timeout=3)
             indice = fg_response['data'][0]
             valor_fg = int(indice['value'])
             
@@ -1232,31 +1661,39 @@ def obter_dados_fundamentais():
         except:
             fear_greed = "Indisponível"
         
-        return (
+        texto = (
             f"*🌍 CONTEXTO MACRO:*\n"
             f"• Cap. Total: {abreviar_valor(market_cap)} {emoji_cap} ({market_cap_change:+.1f}%)\n"
             f"• Domínio BTC: {btc_dominance:.1f}%\n"
             f"• Fear & Greed: {fear_greed}"
             + contexto
         )
+        return texto, True
     
     except Exception as e:
-        return "*Dados macro indisponíveis*"
+        return "*Dados macro indisponíveis*", False
 
 # ===============================
 # === COMUNICAÇÃO TELEGRAM
 # ===============================
 
+def alerta_em_espera(par, setup):
+    """Indica se o par/setup ainda está na janela de reenvio (sem registrar nada)"""
+    enviado = alertas_enviados.get((par, setup))
+    return enviado is not None and time.monotonic() - enviado < TEMPO_REENVIO
+
 def pode_enviar_alerta(par, setup):
-    agora = datetime.datetime.utcnow()
-    chave = f"{par}_{setup}"
+    if alerta_em_espera(par, setup):
+        return False
     
-    if chave in alertas_enviados:
-        delta = (agora - alertas_enviados[chave]).total_seconds()
-        if delta < TEMPO_REENVIO:
-            return False
+    # Relógio monotônico: só importa o intervalo, não a data
+    agora = time.monotonic()
+    
+    # Entradas fora da janela de reenvio não bloqueiam mais nada: descarta pelo início
+    while alertas_enviados and agora - next(iter(alertas_enviados.values())) >= TEMPO_REENVIO:
+        alertas_enviados.popitem(last=False)
     
-    alertas_enviados[chave] = agora
+    alertas_enviados[(par, setup)] = agora
     return True
 
 def enviar_telegram(mensagem):
@@ -1264,7 +1701,6 @@ def enviar_telegram(mensagem):
         print(f"[TELEGRAM SIMULADO] {mensagem}")
         return True
     
-    url = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
     payload = {
         "chat_id": CHAT_ID,
         "text": mensagem,
@@ -1273,13 +1709,76 @@ def enviar_telegram(mensagem):
     }
     
     try:
-        response = requests.post(url, data=payload, timeout=10)
+        if orjson is not None:
+            response = SESSAO_HTTP.post(URL_TELEGRAM, data=orjson.dumps(payload),
+                                        headers=CABECALHO_JSON, timeout=10)
+        else:
+            response = SESSAO_HTTP.post(URL_TELEGRAM, json=payload, timeout=10)
         return response.status_code == 200
     except:
         return False
 
-def enviar_alerta_avancado(par, analise_tf, setup_info):
-    """Alerta com análise de múltiplos timeframes + (B) bloco de componentes 0–100 opcional."""
+# Envios que não decidem nada no fluxo (notificações de fechamento) saem em segundo plano
+POOL_TELEGRAM = ThreadPoolExecutor(max_workers=2)
+_envios_pendentes = []
+
+def enviar_em_segundo_plano(func, *args):
+    """Agenda func(*args) no pool do Telegram sem bloquear a análise"""
+    _envios_pendentes.append(POOL_TELEGRAM.submit(func, *args))
+
+def aguardar_envios(timeout=30):
+    """Espera os envios em segundo plano do ciclo; falhas só vão para o log"""
+    pendentes = list(_envios_pendentes)
+    _envios_pendentes.clear()
+    _, nao_concluidos = wait(pendentes, timeout=timeout)
+    for futuro in pendentes:
+        if futuro in nao_concluidos:
+            continue
+        erro = futuro.exception()
+        if erro is not None:
+            logging.error(f"Envio em segundo plano falhou: {erro}")
+    if nao_concluidos:
+        logging.warning(f"{len(nao_concluidos)} envio(s) ainda pendente(s) após {timeout}s")
+
+# Blocos fixos do alerta (montados com format_map)
+MODELO_CABECALHO_ALERTA = (
+    "{emoji} *{setup}*\n"
+    "{prioridade}\n\n"
+    "📊 Par: `{par}`\n"
+    "💰 Preço: `${preco:,.2f}`\n"
+    "🎯 Alvo: `${alvo:,.2f}`\n"
+    "🛑 Stop: `${stop:,.2f}`\n\n"
+    "📊 *Score:* {score_visual}\n"
+    "🎲 *Risco:* {risco_emoji} {risco_nivel}\n\n"
+)
+
+MODELO_INDICADORES_ALERTA = (
+    "\n*📊 INDICADORES ATUAIS:*\n"
+    "• RSI: {rsi:.1f} | StochRSI: {stoch}\n"
+    "• ADX: {adx:.1f} | MACD: {macd:.4f}\n"
+    "• Volume: {volume_ratio:.1f}x média\n"
+    "• ATR: {atr:.4f}\n\n"
+)
+
+EMOJI_TENDENCIA = {
+    'alta_forte': '🚀',
+    'alta': '📈',
+    'lateral': '➡️',
+    'baixa': '📉',
+    'baixa_forte': '💥'
+}
+
+EMOJI_VOLATILIDADE = {
+    'alta': '🔥',
+    'normal': '🟡',
+    'baixa': '😴'
+}
+
+def enviar_alerta_avancado(par, analise_tf, setup_info, agora_utc=None):
+    """
+    Alerta com análise de múltiplos timeframes + (B) bloco de componentes 0–100 opcional.
+    agora_utc: instante do ciclo da análise (um só carimbo para mensagem e registros).
+    """
     try:
         # Dados do timeframe principal (1h)
         tf_principal = analise_tf.get('1h', {})
@@ -1295,7 +1794,8 @@ def enviar_alerta_avancado(par, analise_tf, setup_info):
 
         # Calcular alvos (sua lógica atual baseada em ATR de 1h)
         df_1h = tf_principal['df']
-        atr = df_1h['atr'].iloc[-1]
+        r = tf_principal['last']
+        atr = r['atr']
 
         if par == 'BTC/USDT':
             stop = round(preco - (atr * 1.2), 2)
@@ -1304,8 +1804,27 @@ def enviar_alerta_avancado(par, analise_tf, setup_info):
             stop = round(preco - (atr * 1.5), 2)
             alvo = round(preco + (atr * 3.0), 2)
 
+        # === SEMANA 1: VALIDAÇÕES E REGISTRO ===
+        # Feitas antes de montar a mensagem: alerta barrado não busca macro nem formata texto
+        logger = logging.getLogger('scanner')
+        agora_utc = agora_utc or datetime.datetime.utcnow()
+        
+        # Extrair dados para validação
+        setup_nome = setup_info.get('setup', 'Desconhecido')
+        
+        # Item 1.2: Validar antes de enviar
+        if not validar_antes_enviar(par, setup_nome, score, preco, stop, alvo):
+            logger.warning(f"❌ Sinal reprovado nas validações: {par}")
+            return False
+        
+        # Item 1.5: Verificar throttle + reenvio do mesmo setup (estado compartilhado entre threads)
+        with lock_alertas:
+            if not verificar_throttle(par, tempo_reenvio_min=TEMPO_REENVIO):
+                return False
+            if not pode_enviar_alerta(par, setup_nome):
+                return False
+
         # Timestamp
-        agora_utc = datetime.datetime.utcnow()
         agora_br = agora_utc - datetime.timedelta(hours=3)
         timestamp = agora_br.strftime('%d/%m %H:%M (BR)')
 
@@ -1317,77 +1836,54 @@ def enviar_alerta_avancado(par, analise_tf, setup_info):
         contexto_macro = obter_dados_fundamentais()
         macro_unico_ativo = os.getenv("ATIVAR_MACRO_UNICO", "false").lower() == "true"
 
-        # Montagem da mensagem (mantive seu estilo)
-        mensagem = (
-            f"{setup_info['emoji']} *{setup_info['setup']}*\n"
-            f"{setup_info['prioridade']}\n\n"
-            f"📊 Par: `{par}`\n"
-            f"💰 Preço: `${preco:,.2f}`\n"
-            f"🎯 Alvo: `${alvo:,.2f}`\n"
-            f"🛑 Stop: `${stop:,.2f}`\n\n"
-            f"📊 *Score:* {score_visual}\n"
-            f"🎲 *Risco:* {risco['emoji']} {risco['nivel']}\n\n"
-        )
+        # Montagem da mensagem (mantive seu estilo); partes unidas com join no final
+        partes = [MODELO_CABECALHO_ALERTA.format_map({
+            'emoji': setup_info['emoji'], 'setup': setup_info['setup'],
+            'prioridade': setup_info['prioridade'], 'par': par,
+            'preco': preco, 'alvo': alvo, 'stop': stop, 'score_visual': score_visual,
+            'risco_emoji': risco['emoji'], 'risco_nivel': risco['nivel'],
+        })]
 
         # Análise por timeframe
-        mensagem += "*📈 ANÁLISE TIMEFRAMES:*\n"
+        partes.append("*📈 ANÁLISE TIMEFRAMES:*\n")
         for tf, dados in analise_tf.items():
             if dados.get('status') == 'ok':
-                tendencia_emoji = {
-                    'alta_forte': '🚀',
-                    'alta': '📈',
-                    'lateral': '➡️',
-                    'baixa': '📉',
-                    'baixa_forte': '💥'
-                }.get(dados['tendencia'], '❓')
-
-                vol_emoji = {
-                    'alta': '🔥',
-                    'normal': '🟡',
-                    'baixa': '😴'
-                }.get(dados['volatilidade'], '❓')
-
-                mensagem += (
+                tendencia_emoji = EMOJI_TENDENCIA.get(dados['tendencia'], '❓')
+                vol_emoji = EMOJI_VOLATILIDADE.get(dados['volatilidade'], '❓')
+                partes.append(
                     f"• {tf}: {tendencia_emoji} {dados['tendencia']} "
                     f"(força: {dados['forca']}/10, vol: {vol_emoji})\n"
                 )
 
         # Indicadores atuais no 1h
-        r = df_1h.iloc[-1]
         stoch_str = ""
         try:
             stoch_val = float(r.get('stoch_rsi', 0)*100.0)
             stoch_str = f"{stoch_val:.1f}"
         except Exception:
             stoch_str = "—"
-        mensagem += (
-            f"\n*📊 INDICADORES ATUAIS:*\n"
-            f"• RSI: {r['rsi']:.1f} | StochRSI: {stoch_str}\n"
-            f"• ADX: {r['adx']:.1f} | MACD: {r['macd']:.4f}\n"
-            f"• Volume: {analise_tf['1h']['volume_ratio']:.1f}x média\n"
-            f"• ATR: {r['atr']:.4f}\n\n"
-        )
+        partes.append(MODELO_INDICADORES_ALERTA.format_map({
+            'rsi': r['rsi'], 'stoch': stoch_str, 'adx': r['adx'], 'macd': r['macd'],
+            'volume_ratio': analise_tf['1h']['volume_ratio'], 'atr': r['atr'],
+        }))
 
         # Critérios bônus
         if criterios_bonus:
-            mensagem += "*🎁 BONUS CONFLUÊNCIA:*\n"
-            for criterio in criterios_bonus[:3]:
-                mensagem += f"{criterio}\n"
-            mensagem += "\n"
+            partes.append("*🎁 BONUS CONFLUÊNCIA:*\n" + "\n".join(criterios_bonus[:3]) + "\n\n")
 
         # Detalhes
         if 'timeframes' in setup_info:
-            mensagem += f"*📋 DETALHES:*\n{setup_info['timeframes']}\n\n"
+            partes.append(f"*📋 DETALHES:*\n{setup_info['timeframes']}\n\n")
         if 'detalhes' in setup_info:
-            mensagem += f"*📋 ESPECÍFICOS:*\n{setup_info['detalhes']}\n\n"
+            partes.append(f"*📋 ESPECÍFICOS:*\n{setup_info['detalhes']}\n\n")
 
         # (B) Bloco de Pontuação 0–100 com componentes (opcional)
         score_100 = None
         if os.getenv("ATIVAR_SCORE_COMPONENTES", "false").lower() == "true":
             try:
-                score_100, comp, confs_txt = gpt_obter_score_100(df_1h)
+                score_100, comp, confs_txt = gpt_comp_resumir(df_1h)
                 linha = gpt_formatar_linha_componentes(comp)
-                mensagem += (
+                partes.append(
                     f"🧮 Pontuação: {score_100}/100\n"
                     f"📎 Componentes: {linha}\n"
                     f"🔎 Confluências: {confs_txt}\n\n"
@@ -1397,10 +1893,10 @@ def enviar_alerta_avancado(par, analise_tf, setup_info):
 
         # (A) Macro dentro do alerta só quando o macro único NÃO estiver ativo
         if not macro_unico_ativo:
-            mensagem += f"{contexto_macro}\n\n"
+            partes.append(f"{contexto_macro}\n\n")
 
-        mensagem += f"🕘 {timestamp}\n"
-        mensagem += f"📉 [TradingView]({link_tv})\n\n"
+        partes.append(f"🕘 {timestamp}\n")
+        partes.append(f"📉 [TradingView]({link_tv})\n\n")
 
         # Recomendação baseada no score (mantido)
         if score >= 8.5:
@@ -1421,22 +1917,8 @@ def enviar_alerta_avancado(par, analise_tf, setup_info):
                 "Setup de qualidade moderada. "
                 "Aguardar mais confirmações pode ser prudente."
             )
-        mensagem += explicacao
-
-        # === SEMANA 1: VALIDAÇÕES E REGISTRO ===
-        logger = logging.getLogger('scanner')
-        
-        # Extrair dados para validação
-        setup_nome = setup_info.get('setup', 'Desconhecido')
-        
-        # Item 1.2: Validar antes de enviar
-        if not validar_antes_enviar(par, setup_nome, score, preco, stop, alvo):
-            logger.warning(f"❌ Sinal reprovado nas validações: {par}")
-            return False
-        
-        # Item 1.5: Verificar throttle
-        if not verificar_throttle(par, tempo_reenvio_min=TEMPO_REENVIO):
-            return False
+        partes.append(explicacao)
+        mensagem = "".join(partes)
         
         # Item 1.3: Adicionar modo na mensagem
         modo = os.getenv('PAPER_MODE', 'true').lower()
@@ -1444,8 +1926,8 @@ def enviar_alerta_avancado(par, analise_tf, setup_info):
             mensagem = f"[📝 PAPER MODE]\n\n{mensagem}"
         
         # Enviar alerta
-        if pode_enviar_alerta(par, setup_nome):
-            if enviar_telegram(mensagem):
+        if enviar_telegram(mensagem):
+            with lock_alertas:
                 # Item 1.4: Registrar no ledger
                 ledger = LedgerSinais()
                 sinal_id = ledger.registrar_sinal(
@@ -1459,9 +1941,10 @@ def enviar_alerta_avancado(par, analise_tf, setup_info):
                 )
                 
                 print(f"✅ ALERTA AVANÇADO: {par} - {setup_nome} (score: {score})")
-                registrar_sinal_monitorado(par, setup_info.get('id', ''), preco, alvo, stop, score_100=score_100)
+                registrar_sinal_monitorado(par, setup_info.get('id', ''), preco, alvo, stop,
+                                           score_100=score_100, agora=agora_utc)
                 logger.info(f"📨 Alerta enviado | ID Ledger: {sinal_id}")
-                return True
+            return True
         
         return False
 
@@ -1473,17 +1956,20 @@ def enviar_alerta_avancado(par, analise_tf, setup_info):
 # === ESTATÍSTICAS
 # ===============================
 
-def salvar_estatisticas(par, timeframe, tendencia, forca, sinais_encontrados):
-    """Salva estatísticas de performance"""
+def salvar_estatisticas(par, timeframe, tendencia, forca, sinais_encontrados, agora=None):
+    """Salva estatísticas de performance (agora: instante UTC do ciclo)"""
     try:
+        agora = agora or datetime.datetime.utcnow()
+        agora_ts = agora.replace(tzinfo=datetime.timezone.utc).timestamp()
+        
         try:
-            with open(ARQUIVO_ESTATISTICAS, 'r') as f:
-                stats = json.load(f)
+            stats = ler_json(ARQUIVO_ESTATISTICAS)
         except FileNotFoundError:
             stats = {"analises": [], "resumo": {}}
         
         nova_analise = {
-            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "timestamp": agora.isoformat(),
+            "ts": agora_ts,
             "par": par,
             "timeframe": timeframe,
             "tendencia": tendencia,
@@ -1498,12 +1984,10 @@ def salvar_estatisticas(par, timeframe, tendencia, forca, sinais_encontrados):
             stats["analises"] = stats["analises"][-150:]
         
         # Resumo 24h
-        agora = datetime.datetime.utcnow()
         sinais_24h = 0
         
         for analise in stats["analises"]:
-            dt_analise = datetime.datetime.fromisoformat(analise["timestamp"])
-            if (agora - dt_analise).total_seconds() <= 86400 and analise["sinais"] > 0:
+            if agora_ts - _epoch_registro(analise) <= 86400 and analise["sinais"] > 0:
                 sinais_24h += 1
         
         stats["resumo"] = {
@@ -1512,8 +1996,7 @@ def salvar_estatisticas(par, timeframe, tendencia, forca, sinais_encontrados):
             "sinais_24h": sinais_24h
         }
         
-        with open(ARQUIVO_ESTATISTICAS, 'w') as f:
-            json.dump(stats, f, indent=2)
+        gravar_json(ARQUIVO_ESTATISTICAS, stats)
             
     except Exception as e:
         logging.error(f"Erro ao salvar estatísticas: {e}")
@@ -1521,8 +2004,7 @@ def salvar_estatisticas(par, timeframe, tendencia, forca, sinais_encontrados):
 def gerar_resumo_estatisticas():
     """Resumo das estatísticas"""
     try:
-        with open(ARQUIVO_ESTATISTICAS, 'r') as f:
-            stats = json.load(f)
+        stats = ler_json(ARQUIVO_ESTATISTICAS)
         
         resumo = stats.get("resumo", {})
         sinais_24h = resumo.get("sinais_24h", 0)
@@ -1535,10 +2017,29 @@ def gerar_resumo_estatisticas():
 # === ANÁLISE PRINCIPAL AVANÇADA
 # ===============================
 
+# Ordem de avaliação dos setups por timeframe (o primeiro alerta enviado encerra a lista).
+# Não há pré-filtro comum: setup_leve e alta_confluencia votam k-de-n critérios, então
+# nenhuma condição isolada é necessária para todos; cada verificador sai cedo sozinho.
+SETUPS_AVANCADOS = (
+    verificar_breakout_volume_avancado,
+    verificar_squeeze_bollinger,
+    verificar_divergencia_rsi
+)
+
+SETUPS_ORIGINAIS = (
+    verificar_setup_alta_confluencia,
+    verificar_setup_rigoroso,
+    verificar_setup_rompimento,
+    verificar_setup_reversao_tecnica,
+    verificar_setup_intermediario,
+    verificar_setup_leve
+)
+
 def analisar_par_avancado(exchange, par):
     """Análise avançada com múltiplos timeframes"""
     try:
         print(f"🔍 Análise avançada de {par}...")
+        agora = datetime.datetime.utcnow()
         
         # Analisar múltiplos timeframes
         analise_tf = analisar_multiplos_timeframes(exchange, par)
@@ -1553,8 +2054,8 @@ def analisar_par_avancado(exchange, par):
         
         # Setup especial: Confluência entre timeframes
         setup_confluencia = verificar_confluencia_timeframes(analise_tf, par)
-        if setup_confluencia:
-            if enviar_alerta_avancado(par, analise_tf, setup_confluencia):
+        if setup_confluencia and not alerta_em_espera(par, setup_confluencia['setup']):
+            if enviar_alerta_avancado(par, analise_tf, setup_confluencia, agora):
                 sinais_encontrados.append(setup_confluencia)
         
         # Analisar setups em cada timeframe
@@ -1562,56 +2063,40 @@ def analisar_par_avancado(exchange, par):
             if dados.get('status') != 'ok':
                 continue
                 
-            df = dados['df']
-            r = df.iloc[-1]
+            # Último candle + arrays por coluna, extraídos uma vez por timeframe
+            r, cols = dados['last'], dados['cols']
+            analise_single = {tf: dados}
             
             # Setups avançados
-            setups_avancados = [
-                verificar_breakout_volume_avancado,
-                verificar_squeeze_bollinger,
-                verificar_divergencia_rsi
-            ]
-            
-            for verificar_setup in setups_avancados:
+            for verificar_setup in SETUPS_AVANCADOS:
                 try:
-                    if verificar_setup == verificar_divergencia_rsi:
-                        setup_info = verificar_setup(df)
-                    else:
-                        setup_info = verificar_setup(r, df)
+                    setup_info = verificar_setup(r, cols)
                         
-                    if setup_info:
-                        analise_single = {tf: dados}
-                        if enviar_alerta_avancado(par, analise_single, setup_info):
+                    # Setup ainda em janela de reenvio: nem monta o alerta
+                    if setup_info and not alerta_em_espera(par, setup_info['setup']):
+                        if enviar_alerta_avancado(par, analise_single, setup_info, agora):
                             sinais_encontrados.append(setup_info)
+                            break
                             
                 except Exception as e:
                     logging.warning(f"Erro em setup avançado: {e}")
             
             # Setups originais
-            setups_originais = [
-                verificar_setup_alta_confluencia,
-                verificar_setup_rigoroso,
-                verificar_setup_rompimento,
-                verificar_setup_reversao_tecnica,
-                verificar_setup_intermediario,
-                verificar_setup_leve
-            ]
-            
-            for verificar_setup in setups_originais:
+            for verificar_setup in SETUPS_ORIGINAIS:
                 try:
-                    setup_info = verificar_setup(r, df)
-                    if setup_info:
-                        analise_single = {tf: dados}
-                        if enviar_alerta_avancado(par, analise_single, setup_info):
+                    setup_info = verificar_setup(r, cols)
+                    if setup_info and not alerta_em_espera(par, setup_info['setup']):
+                        if enviar_alerta_avancado(par, analise_single, setup_info, agora):
                             sinais_encontrados.append(setup_info)
                             break
                 except Exception as e:
                     logging.warning(f"Erro em setup original: {e}")
         
-        # Salvar estatísticas
-        for tf, dados in analise_tf.items():
-            if dados.get('status') == 'ok':
-                salvar_estatisticas(par, tf, dados['tendencia'], dados['forca'], len(sinais_encontrados))
+        # Salvar estatísticas (arquivo compartilhado entre as threads dos pares)
+        with lock_alertas:
+            for tf, dados in analise_tf.items():
+                if dados.get('status') == 'ok':
+                    salvar_estatisticas(par, tf, dados['tendencia'], dados['forca'], len(sinais_encontrados), agora)
         
         return sinais_encontrados
         
@@ -1631,17 +2116,17 @@ def enviar_relatorio_status_avancado(relatorio):
         # Estatísticas
         stats_resumo = gerar_resumo_estatisticas()
         
-        mensagem = (
+        partes = [
             f"🤖 *Scanner Avançado ETH/BTC*\n"
             f"📊 *RELATÓRIO TIMEFRAMES MÚLTIPLOS*\n\n"
             f"⏰ Executado às {agora}\n"
             f"🔍 Análise: Timeframes 1h + 4h\n"
             f"📈 Resultado: Aguardando oportunidades\n"
             f"📝 Sinais ativos: {sinais_abertos}\n\n"
-        )
+        ]
         
         # Status por par
-        mensagem += "*💰 ANÁLISE DETALHADA:*\n"
+        partes.append("*💰 ANÁLISE DETALHADA:*\n")
         for item in relatorio:
             par = item['par']
             preco = item['preco']
@@ -1659,11 +2144,10 @@ def enviar_relatorio_status_avancado(relatorio):
             else:
                 rsi_status = "🟢 Neutro"
             
-            mensagem += f"• {par}: ${preco:,.2f}\n"
-            mensagem += f"  RSI: {rsi:.1f} ({rsi_status})\n"
+            partes.append(f"• {par}: ${preco:,.2f}\n  RSI: {rsi:.1f} ({rsi_status})\n")
         
         # Setups monitorados
-        mensagem += (
+        partes.append(
             f"\n*🔍 SETUPS MONITORADOS:*\n"
             f"• Confluência Timeframes (1h+4h)\n"
             f"• Bollinger Squeeze (explosão)\n"
@@ -1675,6 +2159,8 @@ def enviar_relatorio_status_avancado(relatorio):
             f"🎯 Scanner Avançado ativo"
         )
         
+        mensagem = "".join(partes)
+        
         if enviar_telegram(mensagem):
             print("✅ Relatório avançado enviado")
         else:
@@ -1731,8 +2217,10 @@ def executar_scanner_avancado():
         print("🔍 Verificando sinais monitorados...")
         sinais_atualizados = verificar_sinais_monitorados(exchange)
 
+        # Só pares listados na exchange (checado uma vez, antes do filtro e do loop)
+        pares_exec = [p for p in PARES_ALVOS if p in exchange.markets]
+
         # (D) Filtro de liquidez por volume médio 30d (se ativado)
-        pares_exec = list(PARES_ALVOS)
         if os.getenv("ATIVAR_FILTRO_LIQUIDEZ", "false").lower() == "true":
             minimo = float(os.getenv("LIQ_MINIMO_30D", "1000000"))
             try:
@@ -1740,17 +2228,10 @@ def executar_scanner_avancado():
             except Exception as e:
                 logging.warning(f"Filtro de liquidez falhou (seguindo com pares originais): {e}")
 
-        # Analisar cada par
-        total_sinais = 0
-        relatorio_completo = []
-
-        for par in pares_exec:
-            if par not in exchange.markets:
-                continue
-
+        # Analisar cada par (em paralelo: o tempo é quase todo espera de rede)
+        def processar_par(par):
             print(f"\n🎯 Iniciando análise avançada: {par}")
             sinais = analisar_par_avancado(exchange, par)
-            total_sinais += len(sinais)
 
             # Coletar dados para relatório (mantido)
             try:
@@ -1759,25 +2240,38 @@ def executar_scanner_avancado():
 
                 # RSI básico
                 ohlcv = exchange.fetch_ohlcv(par, '1h', limit=20)
-                df_temp = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-                rsi = RSIIndicator(df_temp['close'], 14).rsi().iloc[-1]
+                rsi = rsi_ultimo(ohlcv_para_array(ohlcv)[:, 4], 14)
 
-                relatorio_completo.append({
+                item = {
                     'par': par,
                     'preco': preco,
                     'rsi': rsi if not pd.isna(rsi) else 0,
                     'sinais': len(sinais)
-                })
+                }
 
             except Exception as e:
-                relatorio_completo.append({
+                item = {
                     'par': par,
                     'preco': 0,
                     'rsi': 0,
                     'sinais': len(sinais)
-                })
+                }
 
-            time.sleep(1)
+            return len(sinais), item
+
+        # O throttle do ccxt síncrono (enableRateLimit) não é thread-safe: lê e grava
+        # lastRestRequestTimestamp sem lock, então chamadas simultâneas dos pares e dos
+        # timeframes escapam do espaçamento. Com 2 pares x 2 timeframes são no máximo
+        # 4 requisições juntas à OKX, bem abaixo do limite público; ao crescer a lista
+        # de pares/timeframes, serializar o exchange com um lock/semáforo.
+        with ThreadPoolExecutor(max_workers=max(1, len(pares_exec))) as pool:
+            resultados_pares = list(pool.map(processar_par, pares_exec))
+
+        total_sinais = sum(n for n, _ in resultados_pares)
+        relatorio_completo = [item for _, item in resultados_pares]
+
+        # Sinais registrados durante o ciclo: uma gravação só
+        _flush_sinais()
 
         print(f"\n✅ SCANNER AVANÇADO FINALIZADO")
         print(f"📨 Total de sinais enviados: {total_sinais}")
@@ -1786,11 +2280,18 @@ def executar_scanner_avancado():
         if total_sinais == 0:
             enviar_relatorio_status_avancado(relatorio_completo)
 
+        aguardar_envios()
         return True
 
     except Exception as e:
         logging.error(f"Erro crítico no scanner avançado: {e}")
 
+        # Não perder sinais já registrados antes da falha
+        try:
+            _flush_sinais()
+        except Exception as e_flush:
+            logging.error(f"Falha ao gravar sinais monitorados: {e_flush}")
+
         # Alerta de erro (mantido)
         if TOKEN != "dummy_token":
             mensagem_erro = (
@@ -1800,6 +2301,7 @@ def executar_scanner_avancado():
             )
             enviar_telegram(mensagem_erro)
 
+        aguardar_envios()
         return False
 # ============================== [GPT] SUPORTES ==============================
 # (B) Pontuação 0–100 com componentes + resumo de “confluências”
@@ -1865,7 +2367,7 @@ def gpt_comp_calcular(df):
         except Exception:
             d["bb_width"] = np.nan
 
-    r = d.iloc[-1]
+    r = ultima_linha(d, ("ema9", "ema21", "ema50", "close", "rsi", "volume", "volume_sma20", "bb_width"))
 
     # ---- Componentes normalizados 0–1
     # Tendência: EMAs em ordem e preço acima de EMA50
@@ -1956,6 +2458,11 @@ def gpt_comp_resumir(df):
     confs_txt = "; ".join(confs) if confs else "—"
     return score_100, comp, confs_txt
 
+def gpt_formatar_linha_componentes(comp):
+    """Linha curta com os componentes em %: 'Tend 67% | Mom 45% | ...'"""
+    nomes = (("tend", "Tend"), ("mom", "Mom"), ("vol", "Vol"), ("volat", "Volat"), ("conf", "Conf"))
+    return " | ".join(f"{rotulo} {100 * float(comp.get(k, 0.0)):.0f}%" for k, rotulo in nomes)
+
 # (A) Macro único por ciclo — enviar 1x no começo
 _GPT_MACRO_ENVIADO = False
 
@@ -1968,7 +2475,7 @@ def gpt_macro_coletar_dados():
     """
     dados = {"total_cap": "-", "btc_dom": "-", "fng": "-", "agenda": "-"}
     try:
-        cg = requests.get("https://api.coingecko.com/api/v3/global", timeout=8).json()
+        cg = obter_json("https://api.coingecko.com/api/v3/global", timeout=8)
         total_cap = cg["data"]["total_market_cap"].get("usd")
         btc_dom = cg["data"]["market_cap_percentage"].get("btc")
         if total_cap:
@@ -1979,7 +2486,7 @@ def gpt_macro_coletar_dados():
         logging.warning(f"Falha CoinGecko (macro): {e}")
 
     try:
-        fng = requests.get("https://api.alternative.me/fng/?limit=1", timeout=6).json()
+        fng = obter_json("https://api.alternative.me/fng/?limit=1", timeout=6)
         item = fng["data"][0]
         dados["fng"] = f"{item['value']} ({item['value_classification']})"
     except Exception as e:
@@ -2021,9 +2528,9 @@ def gpt_liq_filtrar_por_media_30d(exchange, pares: list, minimo: float) -> list:
     for par in pares:
         try:
             ohlcv = exchange.fetch_ohlcv(par, '1d', limit=60)
-            d = pd.DataFrame(ohlcv, columns=['timestamp','open','high','low','close','volume'])
-            d["volume"] = pd.to_numeric(d["volume"], errors="coerce")
-            media30 = float(d["volume"].tail(30).mean())
+            volume = ohlcv_para_array(ohlcv)[-30:, 5]
+            volume = volume[~np.isnan(volume)]
+            media30 = float(volume.mean()) if len(volume) else float('nan')
             (aprovados if media30 >= minimo else reprovados).append(par)
         except Exception as e:
             logging.warning(f"Liquidez: não avaliei {par} ({e}). Mantendo (fail-open).")